@@ -11,6 +11,10 @@ def create_app() -> Flask:
     def inject_config():
         return {"config": app.config}
 
+    # Profiling opt-in, slow-query log & Server-Timing
+    from services import profiling
+    profiling.init_app(app)
+
     # Register blueprints & root route (dari routes/__init__.py)
     from routes import register_routes
     register_routes(app)
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 
 class Config:
@@ -21,6 +22,9 @@ class Config:
     # Validasi file & batas ukuran unggahan
     ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "webp", "gif", "jfif"}
     MAX_CONTENT_LENGTH = int(os.getenv("MAX_CONTENT_LENGTH_MB", "200")) * 1024 * 1024
+    # Budget piksel yang boleh didecode per upload (MP); jauh di bawah default Pillow (~89 MP).
+    # JPEG dihitung setelah draft (decode skala 1/2..1/8), format lain pakai ukuran asli.
+    MAX_UPLOAD_MEGAPIXELS = float(os.getenv("MAX_UPLOAD_MEGAPIXELS", "40"))
 
     # Standarisasi gambar (dipakai di services.equipment_service.to_data_uri_with_std_name)
     # FORMAT: JPEG | WEBP | PNG
@@ -33,6 +37,44 @@ class Config:
     # Batas bytes hasil kompres final; default ikut MAX_CONTENT_LENGTH jika ada, fallback 1MB
     STD_IMAGE_MAX_BYTES = int(os.getenv("STD_IMAGE_MAX_BYTES", str(1 * 1024 * 1024)))
 
+    # Cache disk lokal untuk bytes gambar dari DB (services.image_cache)
+    IMAGE_CACHE_ENABLED = os.getenv("IMAGE_CACHE_ENABLED", "1") not in ("0", "false", "False", "")
+    IMAGE_CACHE_DIR = os.getenv(
+        "IMAGE_CACHE_DIR",
+        os.path.join(tempfile.gettempdir(), "equipment-image-cache")
+    )
+    IMAGE_CACHE_MAX_MB = int(os.getenv("IMAGE_CACHE_MAX_MB", "512"))
+    # Cache-Control max-age untuk URL gambar yang sudah ber-versi (?v=<stamp>)
+    IMAGE_CACHE_MAX_AGE = int(os.getenv("IMAGE_CACHE_MAX_AGE", str(7 * 24 * 3600)))
+
+    # Admission control proses gambar upload (services.admission)
+    # CONCURRENCY: slot proses paralel; QUEUE: maks request menunggu; WAIT_S: batas tunggu
+    # Kalau ADMISSION_LOCK_DIR dikosongkan batas ini per worker, dan hanya berlaku kalau gunicorn
+    # jalan dengan --threads > 1 (worker sync cuma pegang 1 request, jadi batasnya tidak pernah kena).
+    IMAGE_PROC_CONCURRENCY = int(os.getenv("IMAGE_PROC_CONCURRENCY", "2"))
+    IMAGE_PROC_QUEUE = int(os.getenv("IMAGE_PROC_QUEUE", "4"))
+    IMAGE_PROC_WAIT_S = float(os.getenv("IMAGE_PROC_WAIT_S", "10"))
+    IMAGE_PROC_RETRY_AFTER = int(os.getenv("IMAGE_PROC_RETRY_AFTER", "5"))
+    # Folder lokal instance: CONCURRENCY dan QUEUE berlaku untuk semua worker gunicorn di
+    # instance ini (slot + tiket antrian via lock file). Harus disk lokal, bukan share jaringan.
+    ADMISSION_LOCK_DIR = os.getenv(
+        "ADMISSION_LOCK_DIR",
+        os.path.join(tempfile.gettempdir(), "equipment-admission")
+    )
+
+    # ----- Profiling & observability (services.profiling) -----
+    # Fraksi request yang di-profile (0.0 = mati); admin bisa paksa via header X-Profile: <token>
+    PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+    PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+    # Interval sampling stack thread request (ms); output collapsed-stack per request
+    PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+    PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "equipment-profiles"))
+    PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "200"))
+    # Query lebih lambat dari ini (ms) masuk slow-query log; SLOW_QUERY_LOG = path file (opsional)
+    SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "500"))
+    SLOW_QUERY_LOG = os.getenv("SLOW_QUERY_LOG", "")
+    SERVER_TIMING = os.getenv("SERVER_TIMING", "1") not in ("0", "false", "False", "")
+
     # ----- Views/Labels untuk gambar -----
     EXPECTED_VIEWS = {"front", "rear", "left", "right"}
     VIEW_LABELS = {
@@ -47,8 +89,18 @@ class Config:
         "EQUIPMENT_NAMES_FILE",
         str(BASE_DIR / "data" / "equipment_names.txt")
     )
+    # Circuit breaker sumber nama dari DB: buka setelah N gagal berturut-turut,
+    # probe ulang di background setelah cooldown; selama terbuka pakai snapshot last-good
+    NAMES_BREAKER_FAILURES = int(os.getenv("NAMES_BREAKER_FAILURES", "3"))
+    NAMES_BREAKER_COOLDOWN_S = float(os.getenv("NAMES_BREAKER_COOLDOWN_S", "30"))
+    NAMES_SNAPSHOT_FILE = os.getenv(
+        "NAMES_SNAPSHOT_FILE",
+        os.path.join(tempfile.gettempdir(), "equipment-names.snapshot.json")
+    )
 
     # ----- Database (SQL Server) -----
+    # URL SQLAlchemy; kalau diisi, DB_* di bawah diabaikan
+    DATABASE_URL = os.getenv("DATABASE_URL", "")
     DB_SERVER   = os.getenv("DB_SERVER", "sqlmisis-prod.public.6273d55d722a.database.windows.net,3342")
     DB_NAME     = os.getenv("DB_NAME", "dwstage")
     DB_USER     = os.getenv("DB_USER", "dwread")
@@ -1,4 +1,3 @@
-import pyodbc
 from urllib.parse import quote_plus
 from sqlalchemy import create_engine
 from config import Config
@@ -11,6 +10,10 @@ def _parse_server(raw: str):
     return host.strip(), (port.strip() or "1433")
 
 def make_engine():
+    # Override koneksi penuh lewat URL SQLAlchemy (DB_* diabaikan)
+    if Config.DATABASE_URL:
+        return create_engine(Config.DATABASE_URL, pool_pre_ping=True)
+
     host, port = _parse_server(Config.DB_SERVER)
     odbc_str = (
         "Driver={ODBC Driver 17 for SQL Server};"
@@ -0,0 +1,10 @@
+"""
+Config gunicorn untuk `python -m loadtest.run --mode gunicorn`:
+pasang hook stand-in SQLite ke db.ENGINE di tiap worker sebelum melayani request.
+"""
+
+
+def post_worker_init(worker):
+    import db
+    from loadtest.standin import install
+    install(db.ENGINE)
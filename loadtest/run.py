@@ -0,0 +1,471 @@
+"""
+Load generator HTTP untuk app equipment dengan traffic mix yang realistis.
+
+Contoh:
+  # in-process (Flask test client), stand-in SQLite di-seed otomatis
+  python -m loadtest.run --duration 30 --concurrency 8
+
+  # spawn gunicorn lokal (2 worker) di atas stand-in yang sama
+  python -m loadtest.run --mode gunicorn --workers 2 --duration 60
+
+  # server yang sudah jalan (RSS diambil dari --pid kalau diisi)
+  python -m loadtest.run --mode url --url http://127.0.0.1:8000 --pid 1234
+
+PENTING: di --mode url route upload DIMATIKAN (bobot 0) karena upload menimpa gambar unit
+asli di DB target. Aktifkan hanya dengan --allow-writes, dan hanya ke environment uji.
+
+Mix default (bobot, bisa diubah via --mix route=w,...):
+  list, search (q=), deep (halaman belakang), options (burst ketikan), detail,
+  image (URL ber-versi ?v= dari halaman detail, hanya view yang memang bergambar),
+  thumb (hanya unit yang punya folder thumbnail), upload (foto sampel static/uploads/*.jpg).
+
+Laporan: throughput, p50/p95/p99 per route, status code, dan RSS worker dari waktu ke waktu.
+"""
+from __future__ import annotations
+import argparse
+import glob
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import defaultdict
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MIX = {
+    "list": 25, "search": 15, "deep": 5, "options": 20,
+    "detail": 15, "image": 10, "thumb": 7, "upload": 3,
+}
+VIEWS = ("front", "rear", "right", "left")
+
+
+# ---------- Klien (in-process / HTTP) ----------
+class InProcessClient:
+    def __init__(self, app):
+        self._app = app
+        self._local = threading.local()
+
+    def _c(self):
+        if not hasattr(self._local, "c"):
+            self._local.c = self._app.test_client()
+        return self._local.c
+
+    def get(self, path):
+        r = self._c().get(path)
+        n = len(r.get_data())
+        r.close()
+        return r.status_code, n
+
+    def get_text(self, path) -> str | None:
+        r = self._c().get(path)
+        try:
+            return r.get_data(as_text=True) if r.status_code == 200 else None
+        finally:
+            r.close()
+
+    def post_file(self, path, field, filename, data):
+        from io import BytesIO
+        r = self._c().post(path, data={field: (BytesIO(data), filename)},
+                           content_type="multipart/form-data")
+        n = len(r.get_data())
+        r.close()
+        return r.status_code, n
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *a, **kw):
+        return None
+
+
+class HttpClient:
+    def __init__(self, base_url):
+        self.base = base_url.rstrip("/")
+        self._opener = urllib.request.build_opener(_NoRedirect)
+
+    def _send(self, req):
+        try:
+            with self._opener.open(req, timeout=60) as r:
+                return r.status, len(r.read())
+        except urllib.error.HTTPError as e:
+            return e.code, len(e.read() or b"")
+        except OSError:
+            return 0, 0
+
+    def get(self, path):
+        return self._send(urllib.request.Request(self.base + path))
+
+    def get_text(self, path) -> str | None:
+        try:
+            with self._opener.open(self.base + path, timeout=60) as r:
+                return r.read().decode("utf-8", "replace")
+        except OSError:
+            return None
+
+    def post_file(self, path, field, filename, data):
+        boundary = uuid.uuid4().hex
+        body = (
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            "Content-Type: image/jpeg\r\n\r\n"
+        ).encode() + data + f"\r\n--{boundary}--\r\n".encode()
+        req = urllib.request.Request(self.base + path, data=body, method="POST", headers={
+            "Content-Type": f"multipart/form-data; boundary={boundary}",
+        })
+        return self._send(req)
+
+
+# ---------- Skenario ----------
+class Scenario:
+    def __init__(self, client, targets, photos, last_page):
+        self.client = client
+        self.names = targets.names
+        self.image_pairs = targets.image_pairs
+        self.thumbs = targets.thumbs
+        self.photos = photos
+        self.last_page = last_page
+        self._image_urls = {}  # unit -> {view: URL ber-versi dari halaman detail}
+
+    def _image_url(self, unit, view):
+        """URL gambar seperti yang dipakai browser: diambil dari halaman detail (?v=<stamp>)."""
+        urls = self._image_urls.get(unit)
+        if urls is None:
+            urls = _detail_image_urls(self.client.get_text(f"/equipment/{unit}") or "")
+            self._image_urls[unit] = urls
+        return urls.get(view) or f"/equipment/{unit}/image/{view}"
+
+    @staticmethod
+    def _do(record, route, fn, *a):
+        t0 = time.perf_counter()
+        status, n = fn(*a)
+        record(route, time.perf_counter() - t0, status, n)
+
+    def run(self, route, rng, record):
+        c = self.client
+        if route == "list":
+            self._do(record, route, c.get, "/equipment/")
+        elif route == "search":
+            q = rng.choice(self.names)[: rng.randint(2, 4)]
+            self._do(record, route, c.get, f"/equipment/?q={q}")
+        elif route == "deep":
+            page = rng.randint(max(1, self.last_page - 5), self.last_page)
+            self._do(record, route, c.get, f"/equipment/?page={page}")
+        elif route == "options":
+            # burst ketikan: tiap huruf setelah huruf ke-3 = satu request
+            name = rng.choice(self.names)
+            for i in range(3, len(name) + 1):
+                self._do(record, route, c.get, f"/equipment/options?q={name[:i]}")
+                time.sleep(rng.uniform(0.02, 0.12))
+        elif route == "detail":
+            self._do(record, route, c.get, f"/equipment/{rng.choice(self.names)}")
+        elif route == "image":
+            self._do(record, route, c.get, self._image_url(*rng.choice(self.image_pairs)))
+        elif route == "thumb":
+            self._do(record, route, c.get, f"/equipment/thumb/{rng.choice(self.thumbs)}")
+        elif route == "upload":
+            data = rng.choice(self.photos)
+            unit = rng.choice(self.names)
+            path = f"/equipment/{unit}/upload/{rng.choice(VIEWS)}"
+            self._do(record, route, c.post_file, path, "image", "photo.jpg", data)
+            # stamp unit ini berubah -> URL ber-versi diambil ulang dari detail
+            self._image_urls.pop(unit, None)
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.lat = defaultdict(list)
+        self.status = defaultdict(lambda: defaultdict(int))
+        self.bytes = defaultdict(int)
+
+    def __call__(self, route, dt, status, n):
+        with self.lock:
+            self.lat[route].append(dt)
+            self.status[route][status] += 1
+            self.bytes[route] += n
+
+
+# ---------- Memori ----------
+def _rss_kb(pid) -> int | None:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for ln in f:
+                if ln.startswith("VmRSS:"):
+                    return int(ln.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def _children(pid) -> list[int]:
+    out = []
+    for st in glob.glob("/proc/[0-9]*/stat"):
+        try:
+            with open(st) as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            if int(fields[1]) == pid:
+                out.append(int(st.split("/")[2]))
+        except (OSError, IndexError, ValueError):
+            continue
+    return out
+
+
+class MemorySampler(threading.Thread):
+    def __init__(self, pids_fn, interval):
+        super().__init__(daemon=True)
+        self.pids_fn = pids_fn
+        self.interval = interval
+        self.samples = []  # (t, {pid: rss_kb})
+        self.stop = threading.Event()
+
+    def run(self):
+        t0 = time.monotonic()
+        while not self.stop.is_set():
+            snap = {p: r for p in self.pids_fn() if (r := _rss_kb(p)) is not None}
+            self.samples.append((time.monotonic() - t0, snap))
+            self.stop.wait(self.interval)
+
+
+# ---------- Setup ----------
+def _parse_mix(s, allow_writes=True):
+    mix = dict(DEFAULT_MIX)
+    if not allow_writes:
+        mix["upload"] = 0
+    if s:
+        for part in s.split(","):
+            k, _, w = part.partition("=")
+            k = k.strip()
+            if k not in DEFAULT_MIX:
+                raise SystemExit(f"route tidak dikenal di --mix: {k}")
+            mix[k] = float(w)
+    if not allow_writes and mix["upload"] > 0:
+        raise SystemExit("upload menulis ke DB target; tambahkan --allow-writes kalau memang disengaja")
+    return {k: w for k, w in mix.items() if w > 0}
+
+
+def _load_photos():
+    photos = []
+    for p in sorted(glob.glob(os.path.join(ROOT, "static", "uploads", "*.jpg"))):
+        with open(p, "rb") as f:
+            photos.append(f.read())
+    if not photos:
+        from loadtest.standin import _sample_jpeg
+        photos = [_sample_jpeg(random.Random(1), (3000, 2000))]
+    return photos
+
+
+def _prepare_env(args):
+    """Seed stand-in dan set env SEBELUM config/app di-import."""
+    work = args.workdir or tempfile.mkdtemp(prefix="equipment-loadtest-")
+    url = f"sqlite:///{os.path.join(work, 'db', 'main.db')}"
+    upload_root = os.path.join(work, "uploads")
+    env = {
+        "DATABASE_URL": url,
+        "UPLOAD_ROOT": upload_root,
+        "FOLDER_REPO_ROOT": os.path.join(work, "repo"),
+        "IMAGE_CACHE_DIR": os.path.join(work, "image-cache"),
+        "NAMES_SNAPSHOT_FILE": os.path.join(work, "names.snapshot.json"),
+        "ADMISSION_LOCK_DIR": os.path.join(work, "admission") if args.mode == "gunicorn" else "",
+    }
+    os.environ.update(env)
+    sys.path.insert(0, ROOT)
+    from loadtest.standin import seed
+    t0 = time.perf_counter()
+    targets = seed(url, units=args.units, upload_root=upload_root)
+    print(f"stand-in: {len(targets.names)} unit, {len(targets.image_pairs)} gambar, "
+          f"{len(targets.thumbs)} thumbnail di {work} ({time.perf_counter() - t0:.1f}s)")
+    if args.mode == "inproc":
+        # hook stand-in dipasang dari sisi load test, sebelum app pertama kali konek
+        import db
+        from loadtest.standin import install
+        install(db.ENGINE)
+    return targets, env
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _spawn_gunicorn(args, env):
+    port = _free_port()
+    cmd = [sys.executable, "-m", "gunicorn", "-c", os.path.join(ROOT, "loadtest", "gunicorn_conf.py"),
+           "-w", str(args.workers), "--threads", str(args.threads),
+           "-b", f"127.0.0.1:{port}", "--log-level", "warning", "app:application"]
+    proc = subprocess.Popen(cmd, cwd=ROOT, env={**os.environ, **env},
+                            stdout=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit("gunicorn gagal start")
+        try:
+            urllib.request.urlopen(base + "/equipment/options?q=", timeout=2).read()
+            return proc, base
+        except OSError:
+            time.sleep(0.3)
+    proc.terminate()
+    raise SystemExit("gunicorn tidak siap dalam 30 detik")
+
+
+# ---------- Laporan ----------
+def _pct(xs, p):
+    if not xs:
+        return 0.0
+    xs = sorted(xs)
+    k = min(len(xs) - 1, max(0, int(round(p / 100 * (len(xs) - 1)))))
+    return xs[k]
+
+
+def report(rec, elapsed, mem):
+    total = sum(len(v) for v in rec.lat.values())
+    print(f"\n=== {total} request dalam {elapsed:.1f}s -> {total / elapsed:.1f} req/s ===")
+    hdr = f"{'route':<9}{'count':>7}{'req/s':>8}{'p50ms':>9}{'p95ms':>9}{'p99ms':>9}{'maxms':>9}{'KB/req':>9}  status"
+    print(hdr)
+    print("-" * len(hdr))
+    for route in sorted(rec.lat):
+        xs = rec.lat[route]
+        st = " ".join(f"{k}:{v}" for k, v in sorted(rec.status[route].items()))
+        print(f"{route:<9}{len(xs):>7}{len(xs) / elapsed:>8.1f}"
+              f"{_pct(xs, 50) * 1000:>9.1f}{_pct(xs, 95) * 1000:>9.1f}{_pct(xs, 99) * 1000:>9.1f}"
+              f"{max(xs) * 1000:>9.1f}{rec.bytes[route] / len(xs) / 1024:>9.1f}  {st}")
+
+    if mem and mem.samples:
+        print("\n=== RSS worker (MB) ===")
+        pids = sorted({p for _, s in mem.samples for p in s})
+        print(f"{'t(s)':>6}  " + "  ".join(f"{p:>8}" for p in pids))
+        step = max(1, len(mem.samples) // 20)
+        for t, snap in mem.samples[::step] + ([mem.samples[-1]] if len(mem.samples) % step else []):
+            print(f"{t:>6.1f}  " + "  ".join(
+                f"{snap[p] / 1024:>8.1f}" if p in snap else f"{'-':>8}" for p in pids))
+
+
+# ---------- Main ----------
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    ap.add_argument("--mode", choices=("inproc", "gunicorn", "url"), default="inproc")
+    ap.add_argument("--url", help="base URL untuk --mode url")
+    ap.add_argument("--pid", type=int, action="append", default=[],
+                    help="PID yang RSS-nya dipantau (--mode url); anak proses ikut dipantau")
+    ap.add_argument("--duration", type=float, default=30)
+    ap.add_argument("--concurrency", type=int, default=8, help="jumlah virtual user")
+    ap.add_argument("--think", type=float, default=0.0, help="jeda rata-rata antar aksi per user (s)")
+    ap.add_argument("--units", type=int, default=300, help="jumlah unit sintetis di stand-in")
+    ap.add_argument("--mix", help="bobot route, mis. list=30,upload=0")
+    ap.add_argument("--allow-writes", action="store_true",
+                    help="izinkan upload di --mode url (menimpa gambar unit asli di server target)")
+    ap.add_argument("--workers", type=int, default=2, help="worker gunicorn (--mode gunicorn)")
+    ap.add_argument("--threads", type=int, default=4, help="thread per worker gunicorn")
+    ap.add_argument("--workdir", help="folder stand-in (default: temp dir baru)")
+    ap.add_argument("--mem-interval", type=float, default=1.0)
+    ap.add_argument("--seed", type=int, default=42)
+    args = ap.parse_args(argv)
+
+    # stand-in (inproc/gunicorn) selalu DB sementara; server luar hanya read kecuali diizinkan
+    mix = _parse_mix(args.mix, allow_writes=args.mode != "url" or args.allow_writes)
+    proc = None
+    if args.mode == "url":
+        if not args.url:
+            raise SystemExit("--mode url butuh --url")
+        sys.path.insert(0, ROOT)
+        client = HttpClient(args.url)
+        targets = _discover(client)
+        pids_fn = lambda: [p for root in args.pid for p in [root, *_children(root)]]
+    else:
+        targets, env = _prepare_env(args)
+        if args.mode == "inproc":
+            from app import application
+            client = InProcessClient(application)
+            pids_fn = lambda: [os.getpid()]
+        else:
+            proc, base = _spawn_gunicorn(args, env)
+            client = HttpClient(base)
+            pids_fn = lambda: [proc.pid, *_children(proc.pid)]
+
+    last_page = _last_page(client)
+    print(f"list: {last_page} halaman")
+    # route tanpa target valid dibuang dari mix, supaya persentilnya tidak mengukur jalur 404
+    for route, pool in (("image", targets.image_pairs), ("thumb", targets.thumbs)):
+        if not pool and mix.pop(route, None):
+            print(f"route {route} dilewati: tidak ada target")
+    scen = Scenario(client, targets, _load_photos(), last_page)
+    rec = Recorder()
+    mem = MemorySampler(pids_fn, args.mem_interval)
+    mem.start()
+
+    routes, weights = zip(*mix.items())
+    stop_at = time.monotonic() + args.duration
+
+    def user(i):
+        rng = random.Random(args.seed * 1000 + i)
+        while time.monotonic() < stop_at:
+            route = rng.choices(routes, weights)[0]
+            scen.run(route, rng, rec)
+            if args.think:
+                time.sleep(rng.expovariate(1 / args.think))
+
+    print(f"mode={args.mode} vu={args.concurrency} durasi={args.duration:.0f}s mix={mix}")
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=user, args=(i,), daemon=True) for i in range(args.concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    mem.stop.set()
+    mem.join()
+    if proc is not None:
+        proc.terminate()
+        proc.wait(10)
+    report(rec, elapsed, mem)
+
+
+def _last_page(client) -> int:
+    """
+    Halaman terakhir list dibaca dari pagination halaman 1 (link terbesar ?page=N).
+    List hanya menampilkan baris tabel gambar, jadi jumlah unit di v_ListEquipment tidak bisa dipakai.
+    """
+    html = client.get_text("/equipment/")
+    if html is None:
+        raise SystemExit("halaman list tidak bisa diambil")
+    return max([1, *(int(p) for p in re.findall(r"[?&;]page=(\d+)", html))])
+
+
+def _detail_image_urls(html: str) -> dict:
+    """{view: URL ber-versi} dari <img src> halaman detail."""
+    return {v: u.replace("&amp;", "&")
+            for u, v in re.findall(r'src="(/equipment/[^"/]+/image/(\w+)\?v=[^"]*)"', html)}
+
+
+def _discover(client, max_pages: int = 5) -> SimpleNamespace:
+    """
+    Ambil target dari server target (mode url, tanpa stand-in): ID unit dan thumbnail dari
+    halaman list, pasangan (unit, view) bergambar dari halaman detail masing-masing unit.
+    """
+    names, thumbs = set(), set()
+    for page in range(1, min(max_pages, _last_page(client)) + 1):
+        html = client.get_text(f"/equipment/?page={page}")
+        if html is None:
+            break
+        names.update(re.findall(r'href="/equipment/([^"/?]+)"', html))
+        thumbs.update(re.findall(r'src="/equipment/thumb/([^"?]+)"', html))
+    names.discard("new")
+    if not names:
+        raise SystemExit("tidak menemukan unit di server target")
+    names = sorted(names)
+    image_pairs = [(n, v) for n in names
+                   for v in _detail_image_urls(client.get_text(f"/equipment/{n}") or "")]
+    return SimpleNamespace(names=names, image_pairs=image_pairs, thumbs=sorted(thumbs))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Stand-in database lokal (SQLite) untuk load test, meniru bagian SQL Server yang dipakai app:
+- schema [dbo] / [Stage] / INFORMATION_SCHEMA -> file SQLite yang di-ATTACH per koneksi
+- fungsi SYSDATETIME() dan DATALENGTH()
+- kolom DATETIME2 dikembalikan sebagai datetime (template memanggil .strftime)
+
+Cara pakai: DATABASE_URL=sqlite:///<dir>/main.db (db.make_engine tetap generik), lalu
+install(db.ENGINE) dari sisi load test: langsung di loadtest.run (in-process) atau lewat
+loadtest/gunicorn_conf.py (tiap worker gunicorn).
+Catatan: `IF NOT EXISTS ... BEGIN ... END` (create_empty_equipment_row / POST /create)
+tidak didukung SQLite, jadi /create tidak masuk traffic mix.
+"""
+from __future__ import annotations
+import base64
+import os
+import random
+import sqlite3
+import weakref
+from datetime import datetime, timedelta
+from io import BytesIO
+from types import SimpleNamespace
+
+from sqlalchemy import create_engine, event, text
+
+SCHEMAS = ("dbo", "Stage", "INFORMATION_SCHEMA")
+_installed = weakref.WeakSet()
+VIEW_COLS = ("Depan", "Belakang", "Kanan", "Kiri")
+VIEW_OF_COL = {"Depan": "front", "Belakang": "rear", "Kanan": "right", "Kiri": "left"}
+
+sqlite3.register_converter("DATETIME2", lambda b: datetime.fromisoformat(b.decode()))
+
+
+def _db_dir(url: str) -> str:
+    path = url.split(":///", 1)[1]
+    return os.path.dirname(os.path.abspath(path))
+
+
+def _sysdatetime() -> str:
+    return datetime.now().isoformat(" ")
+
+
+def _datalength(v):
+    if v is None:
+        return None
+    return len(v) if isinstance(v, (bytes, str)) else len(str(v))
+
+
+def install(engine):
+    """
+    Pasang hook stand-in ke engine SQLite yang sudah ada (idempotent):
+    - do_connect: connect args sqlite3 (detect_types untuk DATETIME2, timeout, lintas thread)
+    - connect   : fungsi SYSDATETIME/DATALENGTH + ATTACH schema sebagai file di folder yang sama
+    """
+    if engine in _installed:
+        return engine
+    d = os.path.dirname(os.path.abspath(engine.url.database))
+    os.makedirs(d, exist_ok=True)
+
+    @event.listens_for(engine, "do_connect")
+    def _connect_args(dialect, conn_rec, cargs, cparams):
+        cparams.update(detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False, timeout=30)
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_conn, _rec):
+        dbapi_conn.create_function("SYSDATETIME", 0, _sysdatetime)
+        dbapi_conn.create_function("DATALENGTH", 1, _datalength)
+        cur = dbapi_conn.cursor()
+        for s in SCHEMAS:
+            cur.execute(f"ATTACH DATABASE ? AS [{s}]", (os.path.join(d, f"{s}.db"),))
+        cur.execute("PRAGMA journal_mode=WAL")
+        cur.execute("PRAGMA [Stage].journal_mode=WAL")
+        cur.close()
+
+    _installed.add(engine)
+    return engine
+
+
+def make_sqlite_engine(url: str):
+    return install(create_engine(url))
+
+
+# ---------- Seed data sintetis ----------
+def _sample_jpeg(rng: random.Random, size=(1024, 768), quality=85) -> bytes:
+    from PIL import Image
+    base = Image.effect_noise(size, 40).convert("RGB")
+    tint = Image.new("RGB", size, tuple(rng.randrange(256) for _ in range(3)))
+    img = Image.blend(base, tint, 0.6)
+    buf = BytesIO()
+    img.save(buf, format="JPEG", quality=quality)
+    return buf.getvalue()
+
+
+def seed(url: str, units: int = 300, image_ratio: float = 0.6, upload_root: str | None = None,
+         image_size=(1024, 768), seed_value: int = 7) -> SimpleNamespace:
+    """
+    Buat ulang tabel stand-in dan isi `units` unit sintetis.
+    ~image_ratio unit masuk tabel gambar (acak 0..4 view terisi); sebagian dapat folder
+    thumbnail di upload_root supaya /thumb juga teruji.
+    Return SimpleNamespace(names, image_pairs=[(unit, view) yang punya gambar],
+    thumbs=[unit yang punya folder thumbnail]).
+    """
+    rng = random.Random(seed_value)
+    d = _db_dir(url)
+    os.makedirs(d, exist_ok=True)
+    for f in os.listdir(d):
+        if f.endswith((".db", ".db-wal", ".db-shm")):
+            os.unlink(os.path.join(d, f))
+
+    # beberapa varian blob supaya tidak semua baris identik
+    blobs = [
+        "data:image/jpeg;base64," + base64.b64encode(_sample_jpeg(rng, image_size)).decode("ascii")
+        for _ in range(4)
+    ]
+    models = ["EX", "DT", "GD", "WL", "DZ", "LV"]
+    names = [f"{rng.choice(models)}{1000 + i:04d}" for i in range(units)]
+
+    engine = make_sqlite_engine(url)
+    with engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE [dbo].[v_ListEquipment] (
+                Equipment NVARCHAR(255), EquipmentName NVARCHAR(255),
+                Site NVARCHAR(64), LastUpdate DATETIME2
+            )"""))
+        conn.execute(text("""
+            CREATE TABLE [Stage].[EquipmentImages] (
+                Equipment NVARCHAR(255) PRIMARY KEY,
+                Depan TEXT, Belakang TEXT, Kanan TEXT, Kiri TEXT,
+                LastUpdate DATETIME2, UpdateBY NVARCHAR(64)
+            )"""))
+        conn.execute(text("""
+            CREATE TABLE [INFORMATION_SCHEMA].[COLUMNS] (
+                TABLE_SCHEMA TEXT, TABLE_NAME TEXT, COLUMN_NAME TEXT, ORDINAL_POSITION INT
+            )"""))
+        cols = [
+            ("dbo", "v_ListEquipment", ["Equipment", "EquipmentName", "Site", "LastUpdate"]),
+            ("Stage", "EquipmentImages", ["Equipment", *VIEW_COLS, "LastUpdate", "UpdateBY"]),
+        ]
+        conn.execute(
+            text("INSERT INTO [INFORMATION_SCHEMA].[COLUMNS] VALUES (:s, :t, :c, :o)"),
+            [{"s": s, "t": t, "c": c, "o": i + 1} for s, t, cs in cols for i, c in enumerate(cs)],
+        )
+
+        now = datetime.now()
+        conn.execute(
+            text("INSERT INTO [dbo].[v_ListEquipment] VALUES (:e, :n, :s, :u)"),
+            [{"e": n, "n": f"Unit {n}", "s": rng.choice(["PIT-A", "PIT-B", "WS"]),
+              "u": (now - timedelta(days=rng.randrange(365))).isoformat(" ")} for n in names],
+        )
+        rows = []
+        for n in names:
+            if rng.random() >= image_ratio:
+                continue
+            filled = rng.sample(VIEW_COLS, rng.randint(0, 4))
+            row = {c: (rng.choice(blobs) if c in filled else None) for c in VIEW_COLS}
+            row.update(e=n, u=(now - timedelta(minutes=rng.randrange(100000))).isoformat(" "), b="seed")
+            rows.append(row)
+        if rows:
+            conn.execute(
+                text("""INSERT INTO [Stage].[EquipmentImages]
+                        (Equipment, Depan, Belakang, Kanan, Kiri, LastUpdate, UpdateBY)
+                        VALUES (:e, :Depan, :Belakang, :Kanan, :Kiri, :u, :b)"""),
+                rows,
+            )
+    engine.dispose()
+
+    thumbs = []
+    if upload_root:
+        thumb = _sample_jpeg(rng, (320, 240), quality=80)
+        for r in rows[: len(rows) // 2]:
+            p = os.path.join(upload_root, r["e"])
+            os.makedirs(p, exist_ok=True)
+            with open(os.path.join(p, "front.jpg"), "wb") as f:
+                f.write(thumb)
+            thumbs.append(r["e"])
+    image_pairs = [(r["e"], VIEW_OF_COL[c]) for r in rows for c in VIEW_COLS if r[c]]
+    return SimpleNamespace(names=names, image_pairs=image_pairs, thumbs=thumbs)
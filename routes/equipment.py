@@ -1,8 +1,9 @@
 from math import ceil
 import os, mimetypes, glob
+from io import BytesIO
 from flask import (
     Blueprint, render_template, redirect, url_for,
-    request, flash, jsonify, send_file, abort
+    request, flash, jsonify, send_file, abort, Response
 )
 
 from config import Config
@@ -13,12 +14,17 @@ from services.equipment_service import (
     get_existing_names_set,
     # detail + image ops
     fetch_equipment_one,
+    fetch_image,
     allowed,
+    inspect_upload,
+    UploadRejected,
     to_data_uri_with_std_name,
     upsert_image_meta,
     remove_image_meta,
 )
 from services import equipment_names
+from services.admission import image_limiter, Overloaded
+from services.profiling import timed
 
 equipment_bp = Blueprint("equipment", __name__, url_prefix="/equipment")
 
@@ -86,6 +92,21 @@ def thumb(name: str):
     mime, _ = mimetypes.guess_type(p)
     return send_file(p, mimetype=mime or "application/octet-stream")
 
+# ---------------- Admission control ----------------
+def _overloaded(retry_after: int):
+    """503 cepat untuk upload saat proses gambar penuh."""
+    return Response(
+        "Server sedang sibuk memproses gambar, coba lagi sebentar.",
+        status=503,
+        headers={"Retry-After": str(retry_after)},
+        mimetype="text/plain",
+    )
+
+@equipment_bp.get("/_admission")
+def admission_stats():
+    """Statistik antrian/penolakan proses gambar (per worker)."""
+    return jsonify(image_limiter.stats())
+
 # ---------------- List ----------------
 @equipment_bp.route("/", endpoint="list")
 @equipment_bp.route("")
@@ -193,11 +214,10 @@ def detail(equipment_id: str):
         "right": "Right Side View",
         "left": "Left Side View",
     }
+    # URL ber-versi (?v=LastUpdate): hit cache disk di /image tanpa query DB
     images = {
-        "front": item.front_image,
-        "rear": item.rear_image,
-        "right": item.right_image,
-        "left": item.left_image,
+        v: url_for("equipment.image", equipment_id=item.id, view=v, v=item.image_stamp)
+        for v in VIEWS if item.has_image.get(v)
     }
 
     return render_template(
@@ -209,6 +229,29 @@ def detail(equipment_id: str):
         title=item.name,
     )
 
+@equipment_bp.get("/<string:equipment_id>/image/<string:view>", endpoint="image")
+def image(equipment_id: str, view: str):
+    """Layani bytes gambar satu view dari cache disk lokal (read-through ke DB)."""
+    v = (view or "").lower()
+    if v not in {"front", "rear", "right", "left"}:
+        abort(404)
+
+    stamp = (request.args.get("v") or "").strip() or None
+    with timed("image"):
+        img = fetch_image(equipment_id, v, stamp=stamp)
+    if not img:
+        abort(404)
+    if img.url:
+        return redirect(img.url)
+
+    # ?v= cocok dengan versi yang dilayani -> aman di-cache browser lama
+    max_age = Config.IMAGE_CACHE_MAX_AGE if stamp and stamp == img.stamp else 0
+    if img.path:
+        # send_file dengan path -> wsgi.file_wrapper (sendfile di gunicorn)
+        mime = img.mime or mimetypes.guess_type(img.path)[0]
+        return send_file(img.path, mimetype=mime or "application/octet-stream", max_age=max_age)
+    return send_file(BytesIO(img.data), mimetype=img.mime, max_age=max_age)
+
 @equipment_bp.post("/<string:equipment_id>/upload/<string:view>", endpoint="upload_view")
 def upload_view(equipment_id: str, view: str):
     """Upload satu view gambar."""
@@ -217,6 +260,10 @@ def upload_view(equipment_id: str, view: str):
         flash("Posisi gambar tidak valid.", "danger")
         return redirect(url_for("equipment.detail", equipment_id=equipment_id))
 
+    # tolak cepat sebelum body multipart dibaca kalau slot + antrian sudah penuh
+    if image_limiter.shed():
+        return _overloaded(image_limiter.retry_after)
+
     file = request.files.get("image")
     if not file or file.filename == "":
         flash("Tidak ada file yang dipilih.", "warning")
@@ -226,10 +273,22 @@ def upload_view(equipment_id: str, view: str):
         flash("File tidak didukung.", "danger")
         return redirect(url_for("equipment.detail", equipment_id=equipment_id))
 
+    # magic bytes + header saja; file rusak/terlalu besar ditolak sebelum decode penuh
+    try:
+        info = inspect_upload(file)
+    except UploadRejected as e:
+        flash(str(e), "danger")
+        return redirect(url_for("equipment.detail", equipment_id=equipment_id))
+
     try:
-        data_uri = to_data_uri_with_std_name(file, equipment_id=equipment_id, view=v)
+        with image_limiter.slot(), timed("image"):
+            data_uri = to_data_uri_with_std_name(file, equipment_id=equipment_id, view=v, info=info)
         upsert_image_meta(equipment_id, v, data_uri, updated_by="admin")
         flash("Gambar berhasil diunggah.", "success")
+    except Overloaded as e:
+        return _overloaded(e.retry_after)
+    except UploadRejected as e:
+        flash(str(e), "danger")
     except Exception as e:
         flash(f"Gagal menyimpan metadata ke DB: {e}", "danger")
 
@@ -0,0 +1,234 @@
+"""
+Admission control untuk kerja CPU-berat (resize + encode gambar upload).
+
+- Mode lintas worker (default, ADMISSION_LOCK_DIR = folder lokal): batas slot DAN antrian
+  berlaku untuk satu instance. Slot = N lock file, antrian = M file tiket (fcntl.flock);
+  tidak ada slot dan tidak ada tiket kosong -> tolak saat itu juga, tanpa menunggu.
+- Mode per worker (ADMISSION_LOCK_DIR kosong, folder tidak bisa dibuat, atau tanpa fcntl):
+  batas konkurensi antar thread + antrian tunggu terbatas (hanya berarti kalau gunicorn
+  jalan dengan --threads > 1).
+- Di atas batas -> Overloaded (route balas 503 + Retry-After), jadi request
+  baca (list/detail) tidak ikut antre di belakang proses gambar.
+"""
+from __future__ import annotations
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from config import Config
+
+try:  # tidak ada di Windows -> fallback ke batas per worker saja
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+log = logging.getLogger(__name__)
+
+# shed()/stats() memeriksa file dengan flock sesaat (mikrodetik); yang gagal lock
+# coba sekali lagi setelah jeda ini supaya probe worker lain tidak terbaca sebagai "penuh"
+_PROBE_RETRY_S = 0.005
+
+
+class Overloaded(Exception):
+    def __init__(self, retry_after: int, reason: str = "busy"):
+        super().__init__(reason)
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class Limiter:
+    def __init__(self, name: str, limit: int, queue: int, wait_s: float,
+                 retry_after: int, lock_dir: str | None = None):
+        self.name = name
+        self.limit = max(1, int(limit))
+        self.queue = max(0, int(queue))
+        self.wait_s = float(wait_s)
+        self.retry_after = max(1, int(retry_after))
+        self.lock_dir = lock_dir if (lock_dir and fcntl is not None) else None
+        if self.lock_dir:
+            try:
+                os.makedirs(self.lock_dir, exist_ok=True)
+            except OSError as e:
+                log.warning("admission lock dir %s tidak bisa dipakai (%s), batas per worker saja",
+                            self.lock_dir, e)
+                self.lock_dir = None
+        self._cond = threading.Condition()
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timeouts = 0
+
+    def shed(self) -> bool:
+        """Cek murah sebelum baca body upload: True (dan dihitung rejected) kalau slot + antrian penuh."""
+        if self.lock_dir:
+            full = self._instance_full()
+            if full:
+                time.sleep(_PROBE_RETRY_S)
+                full = self._instance_full()
+        else:
+            with self._cond:
+                full = self.active >= self.limit and self.waiting >= self.queue
+        if full:
+            with self._cond:
+                self.rejected += 1
+        return full
+
+    @contextmanager
+    def slot(self):
+        deadline = time.monotonic() + self.wait_s
+        if self.lock_dir:
+            fh = self._acquire_file(deadline)
+            with self._cond:
+                self.active += 1
+                self.admitted += 1
+            try:
+                yield
+            finally:
+                _unlock(fh)
+                with self._cond:
+                    self.active -= 1
+            return
+
+        self._acquire_local(deadline)
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.active -= 1
+                self._cond.notify()
+
+    def stats(self) -> dict:
+        with self._cond:
+            out = {
+                "name": self.name,
+                "pid": os.getpid(),
+                "limit": self.limit,
+                "queue_limit": self.queue,
+                "active": self.active,
+                "queue_depth": self.waiting,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "timeouts": self.timeouts,
+                "cross_worker": bool(self.lock_dir),
+            }
+        if self.lock_dir:
+            # gambaran satu instance (semua worker), dari lock file yang sedang dipegang
+            out["instance_active"] = self._count_busy("slot", self.limit)
+            out["instance_queue_depth"] = self._count_busy("queue", self.queue)
+        return out
+
+    # ---------- Internal ----------
+    def _acquire_local(self, deadline: float):
+        with self._cond:
+            if self.active < self.limit:
+                self.active += 1
+                self.admitted += 1
+                return
+            if self.waiting >= self.queue:
+                self.rejected += 1
+                raise Overloaded(self.retry_after, "queue full")
+            self.waiting += 1
+            try:
+                while self.active >= self.limit:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise Overloaded(self.retry_after, "wait timeout")
+                    self._cond.wait(remaining)
+                self.active += 1
+                self.admitted += 1
+            finally:
+                self.waiting -= 1
+
+    def _path(self, kind: str, i: int) -> str:
+        return os.path.join(self.lock_dir, f"{self.name}-{kind}-{i}.lock")
+
+    def _try_lock(self, kind: str, n: int):
+        """Ambil file kosong pertama dari n file (non-blocking); None kalau semua dipegang."""
+        for i in range(n):
+            fh = _try_lock_path(self._path(kind, i))
+            if fh is not None:
+                return fh
+        return None
+
+    def _count_busy(self, kind: str, n: int, stop_at_free: bool = False) -> int:
+        busy = 0
+        for i in range(n):
+            fh = _try_lock_path(self._path(kind, i))
+            if fh is None:
+                busy += 1
+            else:
+                _unlock(fh)
+                if stop_at_free:
+                    break
+        return busy
+
+    def _all_busy(self, kind: str, n: int) -> bool:
+        return self._count_busy(kind, n, stop_at_free=True) >= n
+
+    def _instance_full(self) -> bool:
+        return self._all_busy("slot", self.limit) and self._all_busy("queue", self.queue)
+
+    def _acquire_file(self, deadline: float):
+        fh = self._try_lock("slot", self.limit)
+        if fh is not None:
+            return fh
+        # semua slot terpakai: butuh tiket antrian global, kalau habis -> 503 langsung
+        ticket = self._try_lock("queue", self.queue)
+        if ticket is None:
+            # file yang "terpakai" bisa jadi cuma sedang di-probe shed()/stats() -> cek ulang sekali
+            time.sleep(_PROBE_RETRY_S)
+            fh = self._try_lock("slot", self.limit)
+            if fh is not None:
+                return fh
+            ticket = self._try_lock("queue", self.queue)
+        if ticket is None:
+            with self._cond:
+                self.rejected += 1
+            raise Overloaded(self.retry_after, "queue full")
+        with self._cond:
+            self.waiting += 1
+        try:
+            while True:
+                fh = self._try_lock("slot", self.limit)
+                if fh is not None:
+                    return fh
+                if time.monotonic() >= deadline:
+                    with self._cond:
+                        self.timeouts += 1
+                    raise Overloaded(self.retry_after, "wait timeout")
+                time.sleep(0.05)
+        finally:
+            with self._cond:
+                self.waiting -= 1
+            _unlock(ticket)
+
+
+def _try_lock_path(path: str):
+    fh = open(path, "a+b")
+    try:
+        fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return fh
+    except OSError:
+        fh.close()
+        return None
+
+
+def _unlock(fh):
+    try:
+        fcntl.flock(fh, fcntl.LOCK_UN)
+    finally:
+        fh.close()
+
+
+image_limiter = Limiter(
+    "image",
+    limit=Config.IMAGE_PROC_CONCURRENCY,
+    queue=Config.IMAGE_PROC_QUEUE,
+    wait_s=Config.IMAGE_PROC_WAIT_S,
+    retry_after=Config.IMAGE_PROC_RETRY_AFTER,
+    lock_dir=Config.ADMISSION_LOCK_DIR or None,
+)
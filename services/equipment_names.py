@@ -1,9 +1,19 @@
+from __future__ import annotations
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
 from typing import Dict, Tuple, List
 from sqlalchemy import text
 from flask import current_app
 from db import get_conn
+from services.profiling import fetched
 from config import Config
 
+log = logging.getLogger(__name__)
+
 def _split_schema_object(qualified: str):
     q = qualified.strip().strip("[]")
     parts = q.split(".", 1)
@@ -25,37 +35,146 @@ def _from_db() -> List[str]:
         WHERE {name_col} IS NOT NULL
     """)
     with get_conn() as conn:
-        return [r[0] for r in conn.execute(sql).fetchall()]
+        return [r[0] for r in fetched(conn.execute(sql))]
+
+# ---------- File fallback (parse sekali, reload kalau mtime berubah) ----------
+_file_cache = {"path": None, "mtime": None, "names": []}
 
 def _from_file() -> List[str]:
     p = Config.EQUIPMENT_NAMES_FILE
     try:
-        with open(p, "r", encoding="utf-8") as f:
-            names = [ln.strip() for ln in f if ln.strip()]
-            # uniq while preserving order
-            seen = set()
-            out: List[str] = []
-            for n in names:
-                if n not in seen:
-                    out.append(n)
-                    seen.add(n)
-            return out
+        mtime = os.stat(p).st_mtime
     except FileNotFoundError:
         current_app.logger.warning("equipment_names.txt tidak ditemukan: %s", p)
         return []
+    if _file_cache["path"] == p and _file_cache["mtime"] == mtime:
+        return _file_cache["names"]
+
+    with open(p, "r", encoding="utf-8") as f:
+        names = [ln.strip() for ln in f if ln.strip()]
+        # uniq while preserving order
+        seen = set()
+        out: List[str] = []
+        for n in names:
+            if n not in seen:
+                out.append(n)
+                seen.add(n)
+    _file_cache.update(path=p, mtime=mtime, names=out)
+    return out
+
+# ---------- Last-good snapshot ----------
+_last_good: Dict[str, object] = {"names": None, "at": None}
+
+def _save_snapshot(names: List[str]):
+    p = Config.NAMES_SNAPSHOT_FILE
+    try:
+        os.makedirs(os.path.dirname(p) or ".", exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(p) or ".", suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"at": time.time(), "names": names}, f)
+        os.replace(tmp, p)
+    except OSError as e:
+        log.warning("gagal menulis snapshot nama equipment %s: %s", p, e)
+
+def _load_snapshot() -> List[str] | None:
+    try:
+        with open(Config.NAMES_SNAPSHOT_FILE, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        names = data.get("names")
+        if isinstance(names, list):
+            _last_good.update(names=names, at=data.get("at"))
+            return names
+    except (OSError, ValueError):
+        pass
+    return None
+
+def _remember(names: List[str]):
+    changed = names != _last_good["names"]
+    _last_good.update(names=names, at=time.time())
+    if changed:
+        _save_snapshot(names)
+
+def _last_good_names() -> List[str] | None:
+    return _last_good["names"] if _last_good["names"] is not None else _load_snapshot()
+
+# ---------- Circuit breaker untuk _from_db ----------
+class _Breaker:
+    """
+    closed    : panggil DB normal
+    open      : fail cepat (tanpa menunggu Connection Timeout), layani last-good
+    half-open : setelah cooldown, satu probe di background thread; sukses -> closed
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.opened_at: float | None = None
+        self.probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if self.probing else "open"
+
+    def allow(self) -> bool:
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if not self.probing and time.monotonic() - self.opened_at >= Config.NAMES_BREAKER_COOLDOWN_S:
+                self.probing = True
+                threading.Thread(target=_probe, name="equipment-names-probe", daemon=True).start()
+            return False
+
+    def success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            self.probing = False
+            if self.opened_at is not None or self.failures >= Config.NAMES_BREAKER_FAILURES:
+                self.opened_at = time.monotonic()
+
+_breaker = _Breaker()
+_mapping_cache: Dict[str, object] = {"names": None, "mapping": {}}
+
+def _probe():
+    try:
+        names = _from_db()
+    except Exception as e:
+        log.warning("probe DB nama equipment gagal: %s", e)
+        _breaker.failure()
+        return
+    _remember(names)
+    _breaker.success()
 
 def get_all_unit_names() -> Tuple[str, Dict[str, str]]:
     """
     Returns:
-      source: 'db' | 'file'
+      source: 'db' | 'cache' (last-good, breaker open / DB error) | 'file'
       mapping: dict normalized_name -> canonical_name
     """
-    try:
-        names = _from_db()
-        source = "db"
-    except Exception:
+    names = None
+    source = "db"
+    if _breaker.allow():
+        try:
+            names = _from_db()
+            _breaker.success()
+            _remember(names)
+        except Exception as e:
+            current_app.logger.warning("sumber nama equipment (DB) gagal: %s", e)
+            _breaker.failure()
+    if names is None:
+        names = _last_good_names()
+        source = "cache"
+    if names is None:
         names = _from_file()
         source = "file"
 
-    mapping = {n.strip().upper(): n.strip() for n in names}
-    return source, mapping
+    # list yang sama (file/last-good ter-cache) -> mapping juga dipakai ulang
+    if names is not _mapping_cache["names"]:
+        _mapping_cache.update(names=names, mapping={n.strip().upper(): n.strip() for n in names})
+    return source, _mapping_cache["mapping"]
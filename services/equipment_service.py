@@ -2,14 +2,18 @@ from __future__ import annotations
 import base64
 from datetime import datetime
 from io import BytesIO
+from urllib.parse import unquote_to_bytes
 from types import SimpleNamespace
 
 from PIL import Image, ImageOps
+from PIL.JpegImagePlugin import JpegImageFile
 from sqlalchemy import text
 from werkzeug.utils import secure_filename
 
 from config import Config
 from db import ENGINE
+from services import image_cache
+from services.profiling import fetched
 
 # ---------- Util kecil ----------
 def _split_schema_object(qualified: str):
@@ -22,7 +26,7 @@ def _quoted(schema: str, name: str) -> str:
     return f"[{schema}].[{name}]"
 
 def _get_columns(conn, schema: str, name: str):
-    rows = conn.execute(
+    rows = fetched(conn.execute(
         text("""
             SELECT COLUMN_NAME
             FROM INFORMATION_SCHEMA.COLUMNS
@@ -30,7 +34,7 @@ def _get_columns(conn, schema: str, name: str):
             ORDER BY ORDINAL_POSITION
         """),
         {"s": schema, "n": name}
-    ).all()
+    ))
     return [r[0] for r in rows]
 
 def _img_has_col(conn, col: str) -> bool:
@@ -87,17 +91,38 @@ def as_browser_src(val):
     else:                              mime = "application/octet-stream"
     return f"data:{mime};base64,{s}"
 
+def decode_image_value(val):
+    """
+    Nilai kolom gambar -> (bytes, mime) atau (None, url) untuk gambar eksternal.
+    Return None kalau kosong/tidak bisa didecode.
+    """
+    src = as_browser_src(val)
+    if not src:
+        return None
+    if src.startswith(("http://", "https://")):
+        return None, src
+    head, _, payload = src.partition(",")
+    mime = head[5:].split(";", 1)[0] or "application/octet-stream"
+    try:
+        if ";base64" in head:
+            data = base64.b64decode(payload)
+        else:
+            data = unquote_to_bytes(payload)
+    except (ValueError, TypeError):
+        return None
+    return data, mime
+
 # ---------- LIST ----------
 def fetch_created_equipment_list(q: str = "", page: int = 1, per_page: int = 25):
     with ENGINE.connect() as conn:
-        rows = conn.execute(text(f"""
+        rows = fetched(conn.execute(text(f"""
             SELECT Equipment AS id,
                    COALESCE([{Config.IMG_NAMECOL}], Equipment) AS name,
                    Depan, Belakang, Kanan, Kiri,
                    LastUpdate, UpdateBY
             FROM [{Config.IMG_SCHEMA}].[{Config.IMG_TABLE}]
             ORDER BY LastUpdate DESC, Equipment DESC
-        """)).mappings().all()
+        """)), mappings=True)
 
     items = []
     q_norm = (q or "").strip().lower()
@@ -124,10 +149,10 @@ def fetch_created_equipment_list(q: str = "", page: int = 1, per_page: int = 25)
 
 def get_existing_names_set():
     with ENGINE.connect() as conn:
-        rows = conn.execute(text(f"""
+        rows = fetched(conn.execute(text(f"""
             SELECT UPPER(COALESCE([{Config.IMG_NAMECOL}], Equipment)) AS nm
             FROM [{Config.IMG_SCHEMA}].[{Config.IMG_TABLE}]
-        """)).all()
+        """)))
     return {str(r[0]).upper() for r in rows}
 
 def create_empty_equipment_row(equipment_name: str, created_by: str = "admin"):
@@ -153,6 +178,10 @@ def create_empty_equipment_row(equipment_name: str, created_by: str = "admin"):
 
 # ---------- DETAIL ----------
 def fetch_equipment_one(equipment_id: str):
+    """
+    Metadata detail saja: blob gambar TIDAK ditarik di sini, cukup flag ada/tidak
+    + stamp versi. Bytes gambar dilayani terpisah lewat fetch_image (pakai cache disk).
+    """
     with ENGINE.connect() as conn:
         v = _map_view_columns(conn)
         view_qq = _quoted(v["schema"], v["name"])
@@ -160,12 +189,12 @@ def fetch_equipment_one(equipment_id: str):
         sel_listname = f", i.[{Config.IMG_NAMECOL}] AS __list_name" if has_listname else ""
         if not v["id_col"]:
             return None
-        row = conn.execute(text(f"""
+        row = fetched(conn.execute(text(f"""
             SELECT v.*,
-                   i.Depan     AS __img_front,
-                   i.Belakang  AS __img_rear,
-                   i.Kanan     AS __img_right,
-                   i.Kiri      AS __img_left,
+                   CASE WHEN DATALENGTH(i.Depan)    > 0 THEN 1 ELSE 0 END AS __has_front,
+                   CASE WHEN DATALENGTH(i.Belakang) > 0 THEN 1 ELSE 0 END AS __has_rear,
+                   CASE WHEN DATALENGTH(i.Kanan)    > 0 THEN 1 ELSE 0 END AS __has_right,
+                   CASE WHEN DATALENGTH(i.Kiri)     > 0 THEN 1 ELSE 0 END AS __has_left,
                    i.LastUpdate AS __img_lastupdate,
                    i.UpdateBY   AS __img_updateby
                    {sel_listname}
@@ -173,7 +202,7 @@ def fetch_equipment_one(equipment_id: str):
             LEFT JOIN [{Config.IMG_SCHEMA}].[{Config.IMG_TABLE}] AS i
               ON CAST(i.Equipment AS NVARCHAR(255)) = CAST(v.[{v['id_col']}] AS NVARCHAR(255))
             WHERE v.[{v['id_col']}] = :x
-        """), {"x": equipment_id}).mappings().first()
+        """), {"x": equipment_id}), "first", mappings=True)
         if not row: return None
         r_l = {k.lower(): row[k] for k in row.keys()}
         name = (r_l.get("__list_name") or
@@ -183,23 +212,50 @@ def fetch_equipment_one(equipment_id: str):
                    _pick_variant(r_l, [v["updated_col"], "lastupdate","updateddate","updatedat"])) or datetime.utcnow()
         created_by = (r_l.get("__img_updateby") or
                       _pick_variant(r_l, [v["createdby_col"], "updateby","createdby","username","user"]))
+        has_image = {vw: bool(r_l.get(f"__has_{vw}")) for vw in VIEW_COL}
         return SimpleNamespace(
             id=str(equipment_id),
             name=str(name),
             created_by=created_by,
             updated_at=updated,
-            front_image=as_browser_src(r_l.get("__img_front")),
-            rear_image=as_browser_src(r_l.get("__img_rear")),
-            right_image=as_browser_src(r_l.get("__img_right")),
-            left_image=as_browser_src(r_l.get("__img_left")),
-            image_count=lambda e=None: sum(1 for x in [
-                as_browser_src(r_l.get("__img_front")),
-                as_browser_src(r_l.get("__img_rear")),
-                as_browser_src(r_l.get("__img_right")),
-                as_browser_src(r_l.get("__img_left"))
-            ] if x),
+            has_image=has_image,
+            image_stamp=image_cache.stamp_of(r_l.get("__img_lastupdate")),
+            image_count=lambda e=None: sum(1 for x in has_image.values() if x),
         )
 
+def fetch_image(equipment_id: str, view: str, stamp: str | None = None):
+    """
+    Read-through cache untuk satu view gambar (stamp = image_cache.stamp_of(LastUpdate)).
+    - stamp diketahui (dari ?v=) dan ada di cache -> tanpa query DB sama sekali
+    - miss -> ambil blob + LastUpdate dari DB, decode, simpan ke cache
+    Return SimpleNamespace(path|data, mime, url, stamp) atau None kalau tidak ada gambar.
+    """
+    if stamp:
+        p = image_cache.get(equipment_id, view, stamp)
+        if p:
+            return SimpleNamespace(path=p, data=None, mime=None, url=None, stamp=stamp)
+
+    col = VIEW_COL[view]
+    with ENGINE.connect() as conn:
+        row = fetched(conn.execute(text(f"""
+            SELECT [{col}] AS val, LastUpdate
+            FROM [{Config.IMG_SCHEMA}].[{Config.IMG_TABLE}]
+            WHERE Equipment = :eid
+        """), {"eid": equipment_id}), "first", mappings=True)
+    if not row:
+        return None
+    decoded = decode_image_value(row["val"])
+    if not decoded:
+        return None
+    data, mime = decoded
+    if data is None:
+        return SimpleNamespace(path=None, data=None, mime=None, url=mime, stamp=None)
+
+    db_stamp = image_cache.stamp_of(row["LastUpdate"])
+    p = image_cache.get(equipment_id, view, db_stamp) or \
+        image_cache.put(equipment_id, view, db_stamp, data, mime)
+    return SimpleNamespace(path=p, data=None if p else data, mime=mime, url=None, stamp=db_stamp)
+
 # ---------- Upload helpers ----------
 def allowed(filename: str, mimetype: str | None = None) -> bool:
     if mimetype and str(mimetype).lower().startswith("image/"):
@@ -208,7 +264,72 @@ def allowed(filename: str, mimetype: str | None = None) -> bool:
         ext = filename.rsplit(".", 1)[1].lower()
         if ext in Config.ALLOWED_EXTENSIONS:
             return True
-    return True
+    return False
+
+class UploadRejected(ValueError):
+    """Upload ditolak di tahap validasi (sebelum decode penuh)."""
+
+def sniff_image_format(head: bytes) -> str | None:
+    """Format dari magic bytes: JPEG | PNG | GIF | WEBP, else None."""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "JPEG"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "PNG"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "GIF"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "WEBP"
+    return None
+
+def _draft_side() -> int:
+    # sisi terpanjang target; dipakai untuk dua sumbu supaya aman setelah exif_transpose
+    return max(int(Config.STD_IMAGE_WIDTH), int(Config.STD_IMAGE_HEIGHT))
+
+def _draft_jpeg(img):
+    """
+    Draft untuk keluarga JPEG, termasuk MPO (foto HP multi-frame, subclass JpegImageFile).
+    Dipakai inspect_upload DAN _standardize_to_data_uri supaya ukuran decode-nya sama.
+    """
+    if isinstance(img, JpegImageFile):
+        img.draft("RGB", (_draft_side(), _draft_side()))
+    return img
+
+def _check_pixel_budget(dw: int, dh: int, width: int, height: int):
+    if dw * dh > float(Config.MAX_UPLOAD_MEGAPIXELS) * 1_000_000:
+        raise UploadRejected(
+            f"Resolusi gambar terlalu besar ({width}x{height}); maks {Config.MAX_UPLOAD_MEGAPIXELS:g} MP."
+        )
+
+def inspect_upload(file_storage):
+    """
+    Validasi murah sebelum decode penuh: magic bytes + header saja (Image.open lazy).
+    JPEG/MPO di-draft (decode DCT-scaled 1/2..1/8) mendekati ukuran target, lalu jumlah
+    piksel yang AKAN didecode dicek ke MAX_UPLOAD_MEGAPIXELS.
+    Return SimpleNamespace(format, width, height, decode_width, decode_height); raise UploadRejected.
+    Hasilnya diteruskan ke to_data_uri_with_std_name(info=...).
+    """
+    stream = file_storage.stream
+    stream.seek(0)
+    fmt = sniff_image_format(stream.read(16))
+    stream.seek(0)
+    if not fmt:
+        raise UploadRejected("File bukan gambar PNG/JPG/WebP/GIF.")
+
+    try:
+        img = Image.open(stream, formats=[fmt])
+        width, height = img.size
+        _draft_jpeg(img)
+        dw, dh = img.size
+    except (Image.DecompressionBombError, Image.DecompressionBombWarning):
+        raise UploadRejected("Resolusi gambar terlalu besar.")
+    except (OSError, SyntaxError, ValueError):
+        raise UploadRejected("File gambar rusak atau tidak bisa dibaca.")
+    finally:
+        stream.seek(0)
+
+    _check_pixel_budget(dw, dh, width, height)
+    return SimpleNamespace(format=fmt, width=width, height=height,
+                           decode_width=dw, decode_height=dh)
 
 def _ext_from_mime(mime: str) -> str:
     mime = (mime or "").lower()
@@ -229,7 +350,7 @@ def _build_canonical_filename(equipment_id: str, view: str, mime: str) -> str:
     base = f"{equipment_id}_{POSITION_NAME[view]}"
     return secure_filename(f"{base}.{ext}")
 
-def _standardize_to_data_uri(file_storage, *, filename: str | None = None) -> str:
+def _standardize_to_data_uri(file_storage, *, filename: str | None = None, info=None) -> str:
     cfg = Config
     fmt = str(cfg.STD_IMAGE_FORMAT).upper()              # JPEG/WEBP/PNG
     tgt_w = int(cfg.STD_IMAGE_WIDTH)
@@ -238,7 +359,14 @@ def _standardize_to_data_uri(file_storage, *, filename: str | None = None) -> st
     q_init = int(cfg.STD_IMAGE_QUALITY)
     max_bytes = int(cfg.STD_IMAGE_MAX_BYTES)
 
-    img = Image.open(file_storage.stream)
+    if info is None:
+        info = inspect_upload(file_storage)
+    file_storage.stream.seek(0)
+    img = Image.open(file_storage.stream, formats=[info.format])
+    # decode langsung di skala kecil (libjpeg DCT scaling), sama persis dengan inspect_upload
+    _draft_jpeg(img)
+    if img.size != (info.decode_width, info.decode_height):
+        raise UploadRejected("Ukuran decode gambar tidak sesuai hasil validasi.")
     img = ImageOps.exif_transpose(img)
 
     if fmt in ("JPEG", "WEBP"):
@@ -293,11 +421,11 @@ def _standardize_to_data_uri(file_storage, *, filename: str | None = None) -> st
     name_part = f";name={secure_filename(filename)}" if filename else ""
     return f"data:{mime}{name_part};base64,{b64}"
 
-def to_data_uri_with_std_name(file_storage, equipment_id: str, view: str) -> str:
+def to_data_uri_with_std_name(file_storage, equipment_id: str, view: str, info=None) -> str:
     fmt = str(Config.STD_IMAGE_FORMAT).upper()
     mime = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}.get(fmt, "image/jpeg")
     filename = _build_canonical_filename(equipment_id, view, mime)
-    return _standardize_to_data_uri(file_storage, filename=filename)
+    return _standardize_to_data_uri(file_storage, filename=filename, info=info)
 
 def _ensure_named_data_uri(data_uri: str, equipment_id: str, view: str) -> str:
     if not data_uri or ";name=" in data_uri or not data_uri.startswith("data:image"):
@@ -309,10 +437,25 @@ def _ensure_named_data_uri(data_uri: str, equipment_id: str, view: str) -> str:
 
 VIEW_COL = {"front": "Depan", "rear": "Belakang", "right": "Kanan", "left": "Kiri"}
 
+def _img_last_update(conn, equipment_id: str):
+    return fetched(conn.execute(
+        text(f"""
+            SELECT LastUpdate FROM [{Config.IMG_SCHEMA}].[{Config.IMG_TABLE}]
+            WHERE Equipment = :eid
+        """),
+        {"eid": equipment_id}
+    ), "scalar")
+
+def _restamp_siblings(equipment_id: str, view: str, old_lu, new_lu):
+    siblings = [v for v in VIEW_COL if v != view]
+    image_cache.restamp(equipment_id, siblings,
+                        image_cache.stamp_of(old_lu), image_cache.stamp_of(new_lu))
+
 def upsert_image_meta(equipment_id: str, view: str, data_uri: str, updated_by: str | None):
     data_uri = _ensure_named_data_uri(data_uri, equipment_id, view)
     col = VIEW_COL[view]
     with ENGINE.begin() as conn:
+        old_lu = _img_last_update(conn, equipment_id)
         result = conn.execute(
             text(f"""
                 UPDATE [{Config.IMG_SCHEMA}].[{Config.IMG_TABLE}]
@@ -322,6 +465,7 @@ def upsert_image_meta(equipment_id: str, view: str, data_uri: str, updated_by: s
             {"val": data_uri, "eid": equipment_id, "ub": updated_by}
         )
         if result.rowcount == 0:
+            old_lu = None
             conn.execute(
                 text(f"""
                     INSERT INTO [{Config.IMG_SCHEMA}].[{Config.IMG_TABLE}] (Equipment, [{col}], LastUpdate, UpdateBY)
@@ -329,10 +473,21 @@ def upsert_image_meta(equipment_id: str, view: str, data_uri: str, updated_by: s
                 """),
                 {"eid": equipment_id, "val": data_uri, "ub": updated_by}
             )
+        last_update = _img_last_update(conn, equipment_id)
+
+    # write-through: view berikutnya langsung hit cache tanpa tarik blob dari DB
+    decoded = decode_image_value(data_uri)
+    if decoded and decoded[0] is not None:
+        data, mime = decoded
+        image_cache.put(equipment_id, view, image_cache.stamp_of(last_update), data, mime)
+    else:
+        image_cache.invalidate(equipment_id, view)
+    _restamp_siblings(equipment_id, view, old_lu, last_update)
 
 def remove_image_meta(equipment_id: str, view: str):
     col = VIEW_COL[view]
     with ENGINE.begin() as conn:
+        old_lu = _img_last_update(conn, equipment_id)
         conn.execute(
             text(f"""
                 UPDATE [{Config.IMG_SCHEMA}].[{Config.IMG_TABLE}]
@@ -341,3 +496,6 @@ def remove_image_meta(equipment_id: str, view: str):
             """),
             {"eid": equipment_id}
         )
+        last_update = _img_last_update(conn, equipment_id)
+    image_cache.invalidate(equipment_id, view)
+    _restamp_siblings(equipment_id, view, old_lu, last_update)
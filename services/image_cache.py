@@ -0,0 +1,168 @@
+"""
+Cache disk lokal untuk bytes gambar yang tersimpan di DB (kolom Depan/Belakang/Kanan/Kiri).
+
+Layout:  <IMAGE_CACHE_DIR>/<hash equipment>/<view>-<hash stamp>.<ext>
+- stamp = LastUpdate baris gambar ("0" kalau NULL)
+- tulis atomik (tmp file + os.replace), aman dibaca paralel antar worker gunicorn
+- LRU pakai mtime: di-touch saat hit, file paling lama dibuang saat lewat batas ukuran
+"""
+from __future__ import annotations
+import glob
+import hashlib
+import logging
+import os
+import tempfile
+
+from config import Config
+
+log = logging.getLogger(__name__)
+
+_EXT_BY_MIME = {
+    "image/jpeg": "jpg",
+    "image/png": "png",
+    "image/webp": "webp",
+    "image/gif": "gif",
+}
+
+# ---------- Util kecil ----------
+def _h(s: str, n: int = 16) -> str:
+    return hashlib.sha1(str(s).encode("utf-8")).hexdigest()[:n]
+
+def _root() -> str:
+    return str(Config.IMAGE_CACHE_DIR)
+
+def _unit_dir(equipment_id: str) -> str:
+    return os.path.join(_root(), _h(str(equipment_id).strip().upper()))
+
+def stamp_of(last_update) -> str:
+    """
+    Versi cache = LastUpdate baris (presisi mikrodetik), "0" kalau NULL.
+    Dipakai SAMA persis oleh detail (?v=) dan fetch_image supaya lookup selalu cocok.
+    """
+    if last_update is None:
+        return "0"
+    if hasattr(last_update, "strftime"):
+        return last_update.strftime("%Y%m%d%H%M%S%f")
+    return str(last_update)
+
+# ---------- API ----------
+def get(equipment_id: str, view: str, stamp: str) -> str | None:
+    """Path file cache kalau ada (dan tandai baru dipakai), else None."""
+    if not Config.IMAGE_CACHE_ENABLED or not stamp:
+        return None
+    pattern = os.path.join(_unit_dir(equipment_id), f"{view}-{_h(stamp, 12)}.*")
+    for p in glob.glob(pattern):
+        if p.endswith(".tmp"):
+            continue
+        try:
+            os.utime(p, None)
+        except OSError:
+            continue
+        return p
+    return None
+
+def put(equipment_id: str, view: str, stamp: str, data: bytes, mime: str) -> str | None:
+    """Simpan bytes secara atomik; versi lama untuk (equipment, view) yang sama dibuang."""
+    if not Config.IMAGE_CACHE_ENABLED or not data:
+        return None
+    if len(data) > _max_bytes():
+        return None
+    ext = _EXT_BY_MIME.get((mime or "").lower(), "bin")
+    d = _unit_dir(equipment_id)
+    try:
+        os.makedirs(d, exist_ok=True)
+        final = os.path.join(d, f"{view}-{_h(stamp, 12)}.{ext}")
+        fd, tmp = tempfile.mkstemp(dir=d, prefix=f".{view}-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, final)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+        _drop_others(d, view, keep=final)
+        _evict_if_needed()
+        return final
+    except OSError as e:
+        log.warning("image cache put gagal (%s/%s): %s", equipment_id, view, e)
+        return None
+
+def invalidate(equipment_id: str, view: str | None = None) -> None:
+    """Buang semua versi cache untuk satu view (atau semua view kalau view=None)."""
+    d = _unit_dir(equipment_id)
+    pattern = os.path.join(d, f"{view}-*" if view else "*")
+    for p in glob.glob(pattern):
+        try:
+            os.unlink(p)
+        except OSError:
+            pass
+
+def restamp(equipment_id: str, views, old_stamp: str, new_stamp: str) -> None:
+    """
+    LastUpdate berlaku per baris: upload/hapus satu view mengubah stamp keempat view.
+    View lain kontennya tidak berubah -> cukup rename file cache-nya ke stamp baru.
+    """
+    if not Config.IMAGE_CACHE_ENABLED or not old_stamp or old_stamp == new_stamp:
+        return
+    d = _unit_dir(equipment_id)
+    oh, nh = _h(old_stamp, 12), _h(new_stamp, 12)
+    for v in views:
+        for p in glob.glob(os.path.join(d, f"{v}-{oh}.*")):
+            if p.endswith(".tmp"):
+                continue
+            ext = p.rsplit(".", 1)[1]
+            try:
+                os.replace(p, os.path.join(d, f"{v}-{nh}.{ext}"))
+            except OSError:
+                pass
+
+# ---------- Internal ----------
+def _max_bytes() -> int:
+    return int(Config.IMAGE_CACHE_MAX_MB) * 1024 * 1024
+
+def _drop_others(d: str, view: str, keep: str) -> None:
+    for p in glob.glob(os.path.join(d, f"{view}-*")):
+        if p != keep and not p.endswith(".tmp"):
+            try:
+                os.unlink(p)
+            except OSError:
+                pass
+
+def _evict_if_needed() -> None:
+    """LRU sederhana: scan direktori, buang file dengan mtime tertua sampai di bawah batas."""
+    entries = []
+    total = 0
+    try:
+        units = list(os.scandir(_root()))
+    except OSError:
+        return
+    for u in units:
+        if not u.is_dir():
+            continue
+        try:
+            for f in os.scandir(u.path):
+                if not f.is_file() or f.name.endswith(".tmp"):
+                    continue
+                st = f.stat()
+                entries.append((st.st_mtime, st.st_size, f.path))
+                total += st.st_size
+        except OSError:
+            continue
+
+    limit = _max_bytes()
+    if total <= limit:
+        return
+    # buang sampai ~90% batas supaya tidak evict di setiap put
+    target = int(limit * 0.9)
+    entries.sort()
+    for _, size, path in entries:
+        if total <= target:
+            break
+        try:
+            os.unlink(path)
+            total -= size
+        except OSError:
+            pass
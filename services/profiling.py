@@ -0,0 +1,257 @@
+"""
+Profiling opt-in per request + slow-query log + header Server-Timing.
+
+- Sampling profiler untuk sebagian request (PROFILE_SAMPLE_RATE) atau kalau admin kirim
+  header X-Profile: <PROFILE_TOKEN>. Thread sampler membaca stack thread request saja
+  (sys._current_frames) tiap PROFILE_INTERVAL_MS, jadi request lain di worker yang sama
+  (gunicorn --threads > 1) tidak ikut tercampur - beda dengan cProfile di Python 3.12
+  yang merekam semua thread. Hasil collapsed-stack (.collapsed, siap untuk flamegraph.pl
+  / speedscope) ditulis ke PROFILE_DIR, hanya PROFILE_KEEP file terbaru yang disimpan.
+- Listener SQLAlchemy di db.ENGINE: query di atas SLOW_QUERY_MS dicatat (SQL, bentuk
+  parameter tanpa nilai, durasi, jumlah baris) ke logger "equipment.slowquery".
+  SELECT dikonsumsi lewat fetched() supaya durasi termasuk fetch dan rows = baris yang
+  benar-benar diambil (rowcount driver untuk SELECT selalu -1).
+- Server-Timing: db (execute + fetch) / image / render / total (ms) di setiap response.
+"""
+from __future__ import annotations
+import glob
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+
+from flask import Flask, g, request, has_request_context, before_render_template, template_rendered
+from sqlalchemy import event
+
+from config import Config
+
+slow_log = logging.getLogger("equipment.slowquery")
+
+# ---------- Timing per request ----------
+def _add(metric: str, seconds: float):
+    if has_request_context():
+        timings = g.setdefault("_timings", {})
+        timings[metric] = timings.get(metric, 0.0) + seconds
+
+@contextmanager
+def timed(metric: str):
+    """Akumulasi durasi blok ke Server-Timing request aktif (mis. timed("image"))."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        _add(metric, time.perf_counter() - t0)
+
+# ---------- Slow-query log ----------
+def _params_shape(params):
+    """Bentuk parameter saja (nama/tipe/panjang), nilai tidak ikut ke log."""
+    if isinstance(params, dict):
+        return {k: _value_shape(v) for k, v in params.items()}
+    if isinstance(params, (list, tuple)):
+        if params and isinstance(params[0], (list, tuple, dict)):
+            return f"executemany x{len(params)}"
+        return [_value_shape(v) for v in params]
+    return type(params).__name__
+
+def _value_shape(v):
+    if isinstance(v, (str, bytes)):
+        return f"{type(v).__name__}[{len(v)}]"
+    return type(v).__name__
+
+def _log_slow(elapsed: float, rows, statement, parameters):
+    if elapsed * 1000 < Config.SLOW_QUERY_MS:
+        return
+    sql = re.sub(r"\s+", " ", statement).strip()
+    slow_log.warning(
+        "slow query %.1f ms rows=%s endpoint=%s params=%s sql=%s",
+        elapsed * 1000,
+        "?" if rows is None else rows,
+        request.endpoint if has_request_context() else None,
+        _params_shape(parameters),
+        sql[:2000],
+    )
+
+def _flush_pending(info):
+    """SELECT yang tidak dikonsumsi lewat fetched(): catat durasi execute saja, rows tidak diketahui."""
+    ctx = info.pop("_pending_query", None)
+    entry = getattr(ctx, "_slow_entry", None)
+    if entry:
+        ctx._slow_entry = None
+        _log_slow(*entry)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _flush_pending(conn.info)
+    conn.info.setdefault("_query_start", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stack = conn.info.get("_query_start")
+    if not stack:
+        return
+    elapsed = time.perf_counter() - stack.pop()
+    _add("db", elapsed)
+    if cursor.description is None or context is None:
+        # DML: rowcount dari driver valid (baris yang diubah)
+        _log_slow(elapsed, cursor.rowcount, statement, parameters)
+        return
+    # SELECT: rowcount DBAPI selalu -1 dan biaya terbesar (blob) ada di fetch,
+    # jadi entri baru ditulis saat hasil dikonsumsi lewat fetched()
+    context._slow_entry = (elapsed, None, statement, parameters)
+    conn.info["_pending_query"] = context
+
+def _on_checkin(dbapi_conn, rec):
+    _flush_pending(rec.info)
+
+def fetched(result, how: str = "all", *, mappings: bool = False):
+    """
+    Konsumsi result (how = all | first | scalar) sambil mengukur waktu fetch dan jumlah baris.
+    Waktu fetch masuk metric db; slow-query log mencatat execute + fetch dengan rows sebenarnya.
+    """
+    t0 = time.perf_counter()
+    src = result.mappings() if mappings else result
+    if how == "all":
+        out = src.all()
+        rows = len(out)
+    elif how == "first":
+        out = src.first()
+        rows = int(out is not None)
+    elif how == "scalar":
+        row = result.first()
+        out = None if row is None else row[0]
+        rows = int(row is not None)
+    else:
+        raise ValueError(f"how tidak dikenal: {how}")
+    fetch_s = time.perf_counter() - t0
+    _add("db", fetch_s)
+
+    ctx = result.context
+    entry = getattr(ctx, "_slow_entry", None)
+    if entry:
+        ctx._slow_entry = None
+        exec_s, _, statement, parameters = entry
+        _log_slow(exec_s + fetch_s, rows, statement, parameters)
+    return out
+
+def _attach_engine(engine):
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "checkin", _on_checkin)
+
+# ---------- Profiler ----------
+def _want_profile() -> bool:
+    token = Config.PROFILE_TOKEN
+    if token and request.headers.get("X-Profile") == token:
+        return True
+    rate = Config.PROFILE_SAMPLE_RATE
+    return rate > 0 and random.random() < rate
+
+def _frame_label(frame) -> str:
+    co = frame.f_code
+    parts = co.co_filename.replace("\\", "/").rsplit("/", 2)
+    return f"{co.co_name} ({'/'.join(parts[-2:])}:{co.co_firstlineno})"
+
+class _StackSampler(threading.Thread):
+    """Sampel stack SATU thread (thread request) secara periodik, diagregasi per stack."""
+
+    def __init__(self, ident: int, interval_s: float):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.target = ident
+        self.interval_s = interval_s
+        self.stacks = Counter()
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval_s):
+            frame = sys._current_frames().get(self.target)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+def _dump_profile(sampler: _StackSampler, total_s: float):
+    if not sampler.stacks:
+        return  # request lebih cepat dari satu interval sampling
+    d = Config.PROFILE_DIR
+    try:
+        os.makedirs(d, exist_ok=True)
+        ep = re.sub(r"[^A-Za-z0-9_.-]", "_", request.endpoint or "unknown")
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{request.method}-{ep}-{int(total_s * 1000)}ms.collapsed"
+        with open(os.path.join(d, name), "w", encoding="utf-8") as f:
+            for stack, n in sampler.stacks.most_common():
+                f.write(f"{stack} {n}\n")
+        # rotasi: simpan PROFILE_KEEP file terbaru
+        files = sorted(glob.glob(os.path.join(d, "*.collapsed")), key=os.path.getmtime)
+        for old in files[:max(0, len(files) - Config.PROFILE_KEEP)]:
+            try:
+                os.unlink(old)
+            except OSError:
+                pass
+    except OSError as e:
+        slow_log.warning("gagal menulis profile: %s", e)
+
+# ---------- Hook Flask ----------
+def init_app(app: Flask):
+    from db import ENGINE
+    _attach_engine(ENGINE)
+
+    if Config.SLOW_QUERY_LOG and not slow_log.handlers:
+        h = RotatingFileHandler(Config.SLOW_QUERY_LOG, maxBytes=5 * 1024 * 1024, backupCount=3)
+        h.setFormatter(logging.Formatter("%(asctime)s %(process)d %(message)s"))
+        slow_log.addHandler(h)
+
+    @app.before_request
+    def _start():
+        g._t0 = time.perf_counter()
+        g._timings = {}
+        g._profiler = None
+        if _want_profile():
+            sampler = _StackSampler(threading.get_ident(), Config.PROFILE_INTERVAL_MS / 1000)
+            sampler.start()
+            g._profiler = sampler
+
+    @app.after_request
+    def _finish(response):
+        t0 = g.get("_t0")
+        if t0 is None:
+            return response
+        total = time.perf_counter() - t0
+        sampler = g.get("_profiler")
+        if sampler is not None:
+            sampler.stop()
+            g._profiler = None
+            _dump_profile(sampler, total)
+        if Config.SERVER_TIMING:
+            parts = [f"{k};dur={v * 1000:.1f}" for k, v in g.get("_timings", {}).items()]
+            parts.append(f"total;dur={total * 1000:.1f}")
+            response.headers["Server-Timing"] = ", ".join(parts)
+        return response
+
+    @app.teardown_request
+    def _cleanup(exc):
+        sampler = g.get("_profiler")
+        if sampler is not None:
+            sampler.stop()
+
+    def _render_start(sender, template, context, **extra):
+        g._render_t0 = time.perf_counter()
+
+    def _render_done(sender, template, context, **extra):
+        t0 = g.pop("_render_t0", None)
+        if t0 is not None:
+            _add("render", time.perf_counter() - t0)
+
+    # weak=False: handler lokal di atas tidak punya referensi lain
+    before_render_template.connect(_render_start, app, weak=False)
+    template_rendered.connect(_render_done, app, weak=False)